@@ -2,7 +2,22 @@ import argparse
 import json
 import math
 import os
-from typing import Any, Dict, List
+import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional, Set
+
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
+JPEG_QUALITY = 85
+# 目标帧与当前解码位置相差不超过该帧数时顺序 grab()，否则直接 seek
+SEQUENTIAL_GRAB_LIMIT = 30
+# H.264/HEVC 等长 GOP 编码 seek 后仍要从前一个 IDR 解到目标帧，顺序 grab() 的窗口按秒放宽
+LONG_GOP_FOURCCS = {"avc1", "avc3", "h264", "x264", "hev1", "hvc1", "hevc", "h265"}
+LONG_GOP_GRAB_SECONDS = 2.0
 
 
 def clamp_int(v: Any, fallback: int, min_v: int, max_v: int) -> int:
@@ -23,6 +38,16 @@ def clamp_float(v: Any, fallback: float, min_v: float, max_v: float) -> float:
     return max(min_v, min(max_v, n))
 
 
+def print_json(payload: Dict[str, Any]) -> None:
+    # 直接写 UTF-8 字节：与调用方按 utf8 解码一致，不受 Windows 管道默认编码影响
+    if orjson is not None:
+        data = orjson.dumps(payload)
+    else:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    sys.stdout.buffer.write(data + b"\n")
+    sys.stdout.flush()
+
+
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--video", required=True)
@@ -40,11 +65,29 @@ def main() -> None:
     try:
         import cv2  # type: ignore
     except Exception as e:
-        print(json.dumps({"ok": False, "error": f"missing cv2: {e}"}))
+        print_json({"ok": False, "error": f"missing cv2: {e}"})
         return
 
+    # simplejpeg（libjpeg-turbo SIMD）编码更快；不可用时回退到 cv2.imwrite
+    try:
+        import simplejpeg  # type: ignore
+    except Exception:
+        simplejpeg = None
+
+    def write_jpeg(frame: Any, out_path: str) -> None:
+        if simplejpeg is not None:
+            # 与 cv2.imwrite 一致用 4:2:0 下采样；simplejpeg 默认 4:4:4 会让文件大 ~65% 且更慢
+            buf = simplejpeg.encode_jpeg(
+                frame, quality=JPEG_QUALITY, colorspace="BGR", colorsubsampling="420", fastdct=True
+            )
+            with open(out_path, "wb") as f:
+                f.write(buf)
+            return
+        if not cv2.imwrite(out_path, frame, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY]):
+            raise OSError(f"failed to write {out_path}")
+
     if not os.path.isfile(video_path):
-        print(json.dumps({"ok": False, "error": "video not found", "videoPath": video_path}))
+        print_json({"ok": False, "error": "video not found", "videoPath": video_path})
         return
 
     seg_seconds = clamp_int(args.segment_seconds, 20, 5, 120)
@@ -54,12 +97,17 @@ def main() -> None:
 
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
-        print(json.dumps({"ok": False, "error": "failed to open video", "videoPath": video_path}))
+        print_json({"ok": False, "error": "failed to open video", "videoPath": video_path})
         return
 
     fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
     frame_count = float(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0.0)
     duration_sec = (frame_count / fps) if fps > 0.0 and frame_count > 0.0 else 0.0
+    fourcc_code = int(cap.get(cv2.CAP_PROP_FOURCC) or 0)
+    fourcc = "".join(chr((fourcc_code >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ").lower()
+    grab_limit = SEQUENTIAL_GRAB_LIMIT
+    if fourcc in LONG_GOP_FOURCCS:
+        grab_limit = max(grab_limit, int(round(fps * LONG_GOP_GRAB_SECONDS)))
 
     def safe_read_at_time(t: float):
         cap.set(cv2.CAP_PROP_POS_MSEC, max(0.0, t) * 1000.0)
@@ -68,7 +116,8 @@ def main() -> None:
             return None
         return frame
 
-    segments: List[Dict[str, Any]] = []
+    # 先规划好所有采样点，再按时间顺序统一解码
+    planned: List[Dict[str, Any]] = []
 
     for seg_idx in range(max_segs):
         seg_start = start_seconds + float(seg_idx * seg_seconds)
@@ -90,29 +139,96 @@ def main() -> None:
                 t = min(t, max(0.0, duration_sec - 0.001))
             times.append(t)
 
-        frame_paths: List[str] = []
-        for t in times:
-            frame = safe_read_at_time(t)
-            if frame is None:
-                continue
-            name = f"seg{seg_idx:03d}_t{int(t*1000):010d}.jpg"
-            out_path = os.path.join(out_dir, name)
-            try:
-                cv2.imwrite(out_path, frame, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
-                frame_paths.append(os.path.abspath(out_path))
-            except Exception:
-                continue
-
-        segments.append(
+        planned.append(
             {
                 "index": seg_idx,
                 "startSec": seg_start,
                 "endSec": seg_end,
-                "frames": frame_paths,
+                "outPaths": [os.path.join(out_dir, f"seg{seg_idx:03d}_t{int(t*1000):010d}.jpg") for t in times],
+                "times": times,
             }
         )
 
-    cap.release()
+    written: Set[str] = set()
+    # 解码留在主线程，JPEG 编码与写盘交给线程池（cv2/simplejpeg 编码时会释放 GIL）
+    encode_workers = max(1, min(4, os.cpu_count() or 1))
+    executor = ThreadPoolExecutor(max_workers=encode_workers)
+    pending: Deque["Future[Optional[str]]"] = deque()
+    # 末尾被钳到同一时间点的采样会得到相同文件名，每个路径只提交一次，避免并发写同一文件
+    submitted: Set[str] = set()
+
+    def encode_and_write(frame: Any, out_path: str) -> Optional[str]:
+        try:
+            write_jpeg(frame, out_path)
+        except Exception:
+            return None
+        return out_path
+
+    def drain(limit: int) -> None:
+        while len(pending) > limit:
+            done = pending.popleft().result()
+            if done is not None:
+                written.add(done)
+
+    def emit(frame: Any, out_paths: List[str]) -> None:
+        # cap.read() 每次返回新数组，可直接交给工作线程；限制在途帧数以控制内存
+        for out_path in out_paths:
+            if out_path in submitted:
+                continue
+            submitted.add(out_path)
+            pending.append(executor.submit(encode_and_write, frame, out_path))
+        drain(encode_workers * 2)
+
+    # 解码循环中 cv2 抛异常时也要关闭线程池、释放视频句柄
+    try:
+        if fps > 0.0:
+            # 同一帧号可能被多个采样点命中，只解码一次
+            targets: Dict[int, List[str]] = {}
+            for seg in planned:
+                for t, out_path in zip(seg["times"], seg["outPaths"]):
+                    idx = int(round(t * fps))
+                    if frame_count > 0.0:
+                        idx = min(idx, int(frame_count) - 1)
+                    targets.setdefault(max(0, idx), []).append(out_path)
+
+            # 间隔较近的目标帧用 grab() 顺序跳过，避免每次 seek 都回到关键帧重新解码
+            cur_idx = 0
+            for target in sorted(targets):
+                if target < cur_idx or target - cur_idx > grab_limit:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, float(target))
+                    cur_idx = target
+                while cur_idx < target and cap.grab():
+                    cur_idx += 1
+                if cur_idx != target:
+                    break
+                ok, frame = cap.read()
+                cur_idx += 1
+                if not ok or frame is None:
+                    continue
+                emit(frame, targets[target])
+        else:
+            # 拿不到 fps 时无法换算帧号，退回按时间逐点 seek
+            for seg in planned:
+                for t, out_path in zip(seg["times"], seg["outPaths"]):
+                    frame = safe_read_at_time(t)
+                    if frame is None:
+                        continue
+                    emit(frame, [out_path])
+
+        drain(0)
+    finally:
+        executor.shutdown()
+        cap.release()
+
+    segments: List[Dict[str, Any]] = [
+        {
+            "index": seg["index"],
+            "startSec": seg["startSec"],
+            "endSec": seg["endSec"],
+            "frames": [os.path.abspath(p) for p in seg["outPaths"] if p in written],
+        }
+        for seg in planned
+    ]
 
     out: Dict[str, Any] = {
         "ok": True,
@@ -126,7 +242,7 @@ def main() -> None:
         "startSeconds": start_seconds,
         "segments": segments,
     }
-    print(json.dumps(out, ensure_ascii=False))
+    print_json(out)
 
 
 if __name__ == "__main__":